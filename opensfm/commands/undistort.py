@@ -1,4 +1,7 @@
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
 
 import cv2
 import networkx as nx
@@ -6,7 +9,6 @@ import numpy as np
 from six import iteritems
 
 from opensfm import dataset
-from opensfm import features
 from opensfm import log
 from opensfm import transformations as tf
 from opensfm import types
@@ -61,12 +63,16 @@ class Command:
         data.save_undistorted_reconstruction([urec])
         data.save_undistorted_tracks_graph(ugraph)
 
+        # Sort by camera so each batch of shots dispatched to a worker
+        # shares a camera and hits that worker's undistortion map cache.
         arguments = []
-        for shot in reconstruction.shots.values():
+        for shot in sorted(reconstruction.shots.values(),
+                           key=lambda shot: shot.camera.id):
             arguments.append((shot, undistorted_shots[shot.id], data))
 
         processes = data.config['processes']
-        parallel_map(undistort_image_and_masks, arguments, processes)
+        parallel_map(undistort_image_and_masks, arguments, processes,
+                     max_batch_size=None)
 
 
 def undistort_image_and_masks(arguments):
@@ -74,38 +80,64 @@ def undistort_image_and_masks(arguments):
     log.setup()
     logger.debug('Undistorting image {}'.format(shot.id))
 
-    # Undistort image
-    image = data.load_image(shot.id)
-    if image is not None:
-        max_size = data.config['undistorted_image_max_size']
-        undistorted = undistort_image(shot, undistorted_shots, data, image,
-                                      cv2.INTER_AREA, max_size)
-        for k, v in undistorted.items():
-            data.save_undistorted_image(k, v)
-
-    # Undistort mask
-    mask = data.load_mask(shot.id)
-    if mask is not None:
-        undistorted = undistort_image(shot, undistorted_shots, data, mask,
-                                      cv2.INTER_NEAREST, 1e9)
-        for k, v in undistorted.items():
-            data.save_undistorted_mask(k, v)
-
-    # Undistort segmentation
-    segmentation = data.load_segmentation(shot.id)
-    if segmentation is not None:
-        undistorted = undistort_image(shot, undistorted_shots, data,
-                                      segmentation, cv2.INTER_NEAREST, 1e9)
-        for k, v in undistorted.items():
-            data.save_undistorted_segmentation(k, v)
-
-    # Undistort detections
-    detection = data.load_detection(shot.id)
-    if detection is not None:
-        undistorted = undistort_image(shot, undistorted_shots, data,
-                                      detection, cv2.INTER_NEAREST, 1e9)
-        for k, v in undistorted.items():
-            data.save_undistorted_detection(k, v)
+    # Image decode and encode release the GIL, so prefetch the inputs
+    # and write the outputs on background threads while the main thread
+    # runs the remaps, instead of serializing I/O and compute.
+    with ThreadPoolExecutor(max_workers=2) as io:
+        mask_future = io.submit(data.load_mask, shot.id)
+        segmentation_future = io.submit(data.load_segmentation, shot.id)
+        detection_future = io.submit(data.load_detection, shot.id)
+        saves = []
+
+        # Undistort image
+        image = data.load_image(shot.id)
+        if image is not None:
+            max_size = data.config['undistorted_image_max_size']
+            undistorted = undistort_image(shot, undistorted_shots, data,
+                                          image, cv2.INTER_AREA, max_size)
+            for k, v in undistorted.items():
+                saves.append(io.submit(data.save_undistorted_image, k, v))
+
+        # Undistort mask, segmentation and detection.  They all use
+        # nearest neighbor interpolation at full resolution, so passes
+        # sharing shape and type are stacked as channels and remapped
+        # in a single walk of the remap maps.
+        nearest_inputs = [
+            (mask_future.result(), data.save_undistorted_mask),
+            (segmentation_future.result(),
+             data.save_undistorted_segmentation),
+            (detection_future.result(), data.save_undistorted_detection),
+        ]
+        singles = []
+        batches = {}
+        for original, save in nearest_inputs:
+            if original is None:
+                continue
+            if original.ndim == 2:
+                batches.setdefault((original.shape, original.dtype),
+                                   []).append((original, save))
+            else:
+                singles.append((original, save))
+
+        for batch in batches.values():
+            if len(batch) == 1:
+                singles.append(batch[0])
+                continue
+            stacked = np.dstack([original for original, _ in batch])
+            undistorted = undistort_image(shot, undistorted_shots, data,
+                                          stacked, cv2.INTER_NEAREST, 1e9)
+            for k, v in undistorted.items():
+                for i, (_, save) in enumerate(batch):
+                    saves.append(io.submit(save, k, v[:, :, i]))
+
+        for original, save in singles:
+            undistorted = undistort_image(shot, undistorted_shots, data,
+                                          original, cv2.INTER_NEAREST, 1e9)
+            for k, v in undistorted.items():
+                saves.append(io.submit(save, k, v))
+
+        for save in saves:
+            save.result()
 
 
 def undistort_image(shot, undistorted_shots, data, original, interpolation,
@@ -115,27 +147,69 @@ def undistort_image(shot, undistorted_shots, data, original, interpolation,
 
     projection_type = shot.camera.projection_type
     if projection_type in ['perspective', 'brown', 'fisheye']:
-        undistort_function = {
-            'perspective': undistort_perspective_image,
-            'brown': undistort_brown_image,
-            'fisheye': undistort_fisheye_image,
-        }
+        # Build (or fetch) the maps once, then remap; the same maps
+        # serve the image, mask, segmentation and detection passes.
         new_camera = undistorted_shots[0].camera
-        uf = undistort_function[projection_type]
-        undistorted = uf(original, shot.camera, new_camera, interpolation)
+        height, width = original.shape[:2]
+        if is_identity_undistortion(shot.camera, new_camera, width, height):
+            # A zero-distortion remap is a pure copy.
+            return {shot.id: scale_image(original, max_size)}
+        nearest = interpolation == cv2.INTER_NEAREST
+        if (data.config['undistorted_use_opencl_remap'] and
+                opencl_remap_available()):
+            map1, map2 = undistort_umaps(shot.camera, new_camera,
+                                         width, height, nearest)
+            undistorted = cv2.remap(cv2.UMat(original), map1, map2,
+                                    interpolation).get()
+        else:
+            map1, map2 = undistort_maps(shot.camera, new_camera,
+                                        width, height, nearest)
+            undistorted = cv2.remap(original, map1, map2, interpolation)
         return {shot.id: scale_image(undistorted, max_size)}
     elif projection_type in ['equirectangular', 'spherical']:
         subshot_width = int(data.config['depthmap_resolution'])
         width = 4 * subshot_width
         height = width // 2
-        image = cv2.resize(original, (width, height), interpolation=interpolation)
+        if (interpolation == cv2.INTER_AREA and
+                original.shape[1] > width and
+                original.shape[:2] != (height, width)):
+            # Downscale with area filtering so the sparse sampling below
+            # stays anti-aliased.  Panoramas already at or below the
+            # target size are sampled directly, skipping a same-size or
+            # upscaling resize that gains nothing; the nearest neighbor
+            # passes gain nothing from resampling and always sample the
+            # original.
+            image = cv2.resize(original, (width, height),
+                               interpolation=interpolation)
+        else:
+            image = original
         mint = cv2.INTER_LINEAR if interpolation == cv2.INTER_AREA else interpolation
-        res = {}
-        for subshot in undistorted_shots:
+
+        if (data.config['undistorted_use_cuda_remap'] and
+                cuda_remap_available()):
+            rendered = render_perspective_views_of_a_panorama_cuda(
+                image, shot, undistorted_shots, mint)
+            return {k: scale_image(v, max_size)
+                    for k, v in rendered.items()}
+
+        if (data.config['undistorted_use_opencl_remap'] and
+                opencl_remap_available()):
+            rendered = render_perspective_views_of_a_panorama_opencl(
+                image, shot, undistorted_shots, mint)
+            return {k: scale_image(v, max_size)
+                    for k, v in rendered.items()}
+
+        # The six views are independent and remap releases the GIL, so
+        # render them concurrently within the worker.
+        def render(subshot):
             undistorted = render_perspective_view_of_a_panorama(
                 image, shot, subshot, mint)
-            res[subshot.id] = scale_image(undistorted, max_size)
-        return res
+            return scale_image(undistorted, max_size)
+
+        max_workers = min(len(undistorted_shots), 6)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            renders = executor.map(render, undistorted_shots)
+            return dict(zip([s.id for s in undistorted_shots], renders))
     else:
         raise NotImplementedError(
             'Undistort not implemented for projection type: {}'.format(
@@ -150,39 +224,146 @@ def scale_image(image, max_size):
         return image
     width = int(round(width * factor))
     height = int(round(height * factor))
-    return cv2.resize(image, (width, height), interpolation=cv2.INTER_NEAREST)
+
+    # Halve with pyrDown while the target is at most half the current
+    # size; it is the fastest anti-aliased downscale.  The remainder is
+    # done with area filtering, which has dedicated SIMD kernels, rather
+    # than aliased nearest neighbor sampling.
+    while (image.shape[0] >= 2 * height and image.shape[1] >= 2 * width):
+        image = cv2.pyrDown(image)
+    if image.shape[:2] != (height, width):
+        image = cv2.resize(image, (width, height),
+                           interpolation=cv2.INTER_AREA)
+    return image
+
+
+class _LRUMapCache(object):
+    """Bounded mapping that evicts the least recently used entry.
+
+    Remap maps for large images weigh tens of megabytes each, so the
+    caches holding them are bounded; shots are dispatched sorted by
+    camera, so a few dozen entries are enough to keep the hit rate.
+    Access is locked since the panorama render threads share a cache.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# A panorama shot alone touches twelve map entries per pass cycle: six
+# views sampling the resized image source plus six sampling the
+# original-size mask and segmentation source.
+_MAX_CACHED_MAPS = 32
+
+
+# Undistortion maps depend only on the camera intrinsics and the image
+# size, so they are cached and reused for the image, mask, segmentation
+# and detection passes of a shot, and across shots sharing a camera.
+# The cache is per-process, which is enough for parallel_map workers to
+# amortize map construction over their chunk of shots.
+_undistort_maps_cache = _LRUMapCache(_MAX_CACHED_MAPS)
+
+
+def is_identity_undistortion(camera, new_camera, width, height):
+    """Check whether undistorting is a no-op for the given cameras.
+
+    Fisheye cameras never qualify: even without distortion
+    coefficients, the equidistant projection differs from the
+    perspective one everywhere but at the image center.
+    """
+    if camera.projection_type == 'perspective':
+        coefficients = (camera.k1, camera.k2)
+    elif camera.projection_type == 'brown':
+        coefficients = (camera.k1, camera.k2,
+                        camera.p1, camera.p2, camera.k3)
+    else:
+        return False
+    if any(coefficients):
+        return False
+    return np.array_equal(
+        camera.get_K_in_pixel_coordinates(width, height),
+        new_camera.get_K_in_pixel_coordinates(width, height))
+
+
+def undistort_maps(camera, new_camera, width, height, nearest=False):
+    """Get the remap maps that undistort images of the given size.
+
+    With nearest=True the fractional bits are rounded into the map so
+    that remapping with INTER_NEAREST samples the same source pixels as
+    the float maps would; the fixed-point maps used for the linear and
+    area passes would otherwise truncate towards the top-left neighbor.
+    """
+    key = (camera.id, camera.projection_type, width, height, nearest)
+    maps = _undistort_maps_cache.get(key)
+    if maps is None:
+        K = camera.get_K_in_pixel_coordinates(width, height)
+        new_K = new_camera.get_K_in_pixel_coordinates(width, height)
+        if camera.projection_type == 'perspective':
+            distortion = np.array([camera.k1, camera.k2, 0, 0])
+            mapx, mapy = cv2.initUndistortRectifyMap(
+                K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+        elif camera.projection_type == 'brown':
+            distortion = np.array(
+                [camera.k1, camera.k2, camera.p1, camera.p2, camera.k3])
+            mapx, mapy = cv2.initUndistortRectifyMap(
+                K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+        elif camera.projection_type == 'fisheye':
+            distortion = np.array([camera.k1, camera.k2, 0, 0])
+            mapx, mapy = cv2.fisheye.initUndistortRectifyMap(
+                K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+        else:
+            raise NotImplementedError(
+                'Undistort maps not implemented for projection type: '
+                '{}'.format(camera.projection_type))
+        maps = cv2.convertMaps(mapx, mapy, cv2.CV_16SC2,
+                               nninterpolation=nearest)
+        _undistort_maps_cache[key] = maps
+    return maps
 
 
 def undistort_perspective_image(image, camera, new_camera, interpolation):
     """Remove radial distortion from a perspective image."""
     height, width = image.shape[:2]
-    K = camera.get_K_in_pixel_coordinates(width, height)
-    distortion = np.array([camera.k1, camera.k2, 0, 0])
-    new_K = new_camera.get_K_in_pixel_coordinates(width, height)
-    map1, map2 = cv2.initUndistortRectifyMap(
-        K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+    if is_identity_undistortion(camera, new_camera, width, height):
+        return image
+    map1, map2 = undistort_maps(camera, new_camera, width, height,
+                                interpolation == cv2.INTER_NEAREST)
     return cv2.remap(image, map1, map2, interpolation)
 
 
 def undistort_brown_image(image, camera, new_camera, interpolation):
     """Remove radial distortion from a brown image."""
     height, width = image.shape[:2]
-    K = camera.get_K_in_pixel_coordinates(width, height)
-    distortion = np.array([camera.k1, camera.k2, camera.p1, camera.p2, camera.k3])
-    new_K = new_camera.get_K_in_pixel_coordinates(width, height)
-    map1, map2 = cv2.initUndistortRectifyMap(
-        K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+    if is_identity_undistortion(camera, new_camera, width, height):
+        return image
+    map1, map2 = undistort_maps(camera, new_camera, width, height,
+                                interpolation == cv2.INTER_NEAREST)
     return cv2.remap(image, map1, map2, interpolation)
 
 
 def undistort_fisheye_image(image, camera, new_camera, interpolation):
     """Remove radial distortion from a fisheye image."""
     height, width = image.shape[:2]
-    K = camera.get_K_in_pixel_coordinates(width, height)
-    distortion = np.array([camera.k1, camera.k2, 0, 0])
-    new_K = new_camera.get_K_in_pixel_coordinates(width, height)
-    map1, map2 = cv2.fisheye.initUndistortRectifyMap(
-        K, distortion, None, new_K, (width, height), cv2.CV_32FC1)
+    if is_identity_undistortion(camera, new_camera, width, height):
+        return image
+    map1, map2 = undistort_maps(camera, new_camera, width, height,
+                                interpolation == cv2.INTER_NEAREST)
     return cv2.remap(image, map1, map2, interpolation)
 
 
@@ -232,77 +413,252 @@ def perspective_camera_from_fisheye(fisheye):
     return camera
 
 
+# Names and rotations relative to the panorama of the six perspective
+# views, built once and shared by every panorama.
+PANORAMA_VIEW_ROTATIONS = [
+    ('front', tf.rotation_matrix(-0 * np.pi / 2, (0, 1, 0))[:3, :3]),
+    ('left', tf.rotation_matrix(-1 * np.pi / 2, (0, 1, 0))[:3, :3]),
+    ('back', tf.rotation_matrix(-2 * np.pi / 2, (0, 1, 0))[:3, :3]),
+    ('right', tf.rotation_matrix(-3 * np.pi / 2, (0, 1, 0))[:3, :3]),
+    ('top', tf.rotation_matrix(-np.pi / 2, (1, 0, 0))[:3, :3]),
+    ('bottom', tf.rotation_matrix(+np.pi / 2, (1, 0, 0))[:3, :3]),
+]
+
+_panorama_camera_cache = {}
+
+
+def _perspective_panorama_camera(width):
+    """One shared camera instance per subshot width."""
+    camera = _panorama_camera_cache.get(width)
+    if camera is None:
+        camera = types.PerspectiveCamera()
+        camera.id = 'perspective_panorama_camera'
+        camera.width = width
+        camera.height = width
+        camera.focal = 0.5
+        camera.focal_prior = camera.focal
+        camera.k1 = camera.k1_prior = camera.k2 = camera.k2_prior = 0.0
+        _panorama_camera_cache[width] = camera
+    return camera
+
+
 def perspective_views_of_a_panorama(spherical_shot, width):
     """Create 6 perspective views of a panorama."""
-    camera = types.PerspectiveCamera()
-    camera.id = 'perspective_panorama_camera'
-    camera.width = width
-    camera.height = width
-    camera.focal = 0.5
-    camera.focal_prior = camera.focal
-    camera.k1 = camera.k1_prior = camera.k2 = camera.k2_prior = 0.0
-
-    names = ['front', 'left', 'back', 'right', 'top', 'bottom']
-    rotations = [
-        tf.rotation_matrix(-0 * np.pi / 2, (0, 1, 0)),
-        tf.rotation_matrix(-1 * np.pi / 2, (0, 1, 0)),
-        tf.rotation_matrix(-2 * np.pi / 2, (0, 1, 0)),
-        tf.rotation_matrix(-3 * np.pi / 2, (0, 1, 0)),
-        tf.rotation_matrix(-np.pi / 2, (1, 0, 0)),
-        tf.rotation_matrix(+np.pi / 2, (1, 0, 0)),
-    ]
+    camera = _perspective_panorama_camera(width)
+    pano_rotation = spherical_shot.pose.get_rotation_matrix()
+    origin = spherical_shot.pose.get_origin()
     shots = []
-    for name, rotation in zip(names, rotations):
+    for name, rotation in PANORAMA_VIEW_ROTATIONS:
         shot = types.Shot()
         shot.id = '{}_perspective_view_{}'.format(spherical_shot.id, name)
         shot.camera = camera
-        R = np.dot(rotation[:3, :3], spherical_shot.pose.get_rotation_matrix())
-        o = spherical_shot.pose.get_origin()
         shot.pose = types.Pose()
-        shot.pose.set_rotation_matrix(R)
-        shot.pose.set_origin(o)
+        shot.pose.set_rotation_matrix(np.dot(rotation, pano_rotation))
+        shot.pose.set_origin(origin)
         shots.append(shot)
     return shots
 
 
-def render_perspective_view_of_a_panorama(image, panoshot, perspectiveshot,
-                                          interpolation=cv2.INTER_LINEAR):
-    """Render a perspective view of a panorama."""
-    # Get destination pixel coordinates
-    dst_shape = (perspectiveshot.camera.height, perspectiveshot.camera.width)
-    dst_y, dst_x = np.indices(dst_shape).astype(np.float32)
-    dst_pixels_denormalized = np.column_stack([dst_x.ravel(), dst_y.ravel()])
+# The panorama-to-perspective maps depend on the cameras, the relative
+# rotation between the shots and the panorama size, so they are shared
+# by the image, mask and segmentation passes of a subshot and by all
+# subshots looking in the same direction relative to their panorama.
+_panorama_maps_cache = _LRUMapCache(_MAX_CACHED_MAPS)
+_panorama_gpu_maps_cache = _LRUMapCache(_MAX_CACHED_MAPS)
 
-    dst_pixels = features.normalized_image_coordinates(
-        dst_pixels_denormalized,
-        perspectiveshot.camera.width,
-        perspectiveshot.camera.height)
 
-    # Convert to bearing
-    dst_bearings = perspectiveshot.camera.pixel_bearing_many(dst_pixels)
+def _panorama_map_key(camera, rotation, src_h, src_w, nearest=False):
+    return (camera.id, camera.width, camera.height,
+            camera.focal, camera.k1, camera.k2,
+            src_h, src_w, nearest, rotation.tobytes())
 
-    # Rotate to panorama reference frame
+
+def _panorama_rotation(panoshot, perspectiveshot):
     rotation = np.dot(panoshot.pose.get_rotation_matrix(),
                       perspectiveshot.pose.get_rotation_matrix().T)
-    rotated_bearings = np.dot(dst_bearings, rotation.T)
+    # The Rodrigues round trip through the poses leaves float rounding
+    # noise in the order of 1e-16, which would make the byte-wise cache
+    # key unique per panorama.  Rounding far below map precision makes
+    # equal view directions hash equal across panoramas; adding 0.0
+    # folds the -0.0 entries that would still differ byte-wise.
+    return np.round(rotation, 12) + 0.0
+
+
+def _panorama_maps(panoshot, perspectiveshot, src_h, src_w, nearest=False):
+    """Get the fixed-point remap maps for a perspective view.
+
+    With nearest=True the fractional bits are rounded into the map so
+    that remapping with INTER_NEAREST samples the same source pixels as
+    the float maps would.
+    """
+    rotation = _panorama_rotation(panoshot, perspectiveshot)
+    key = _panorama_map_key(perspectiveshot.camera, rotation,
+                            src_h, src_w, nearest)
+    maps = _panorama_maps_cache.get(key)
+    if maps is None:
+        src_x, src_y = _build_panorama_map(
+            perspectiveshot, rotation, src_h, src_w)
+        maps = cv2.convertMaps(src_x, src_y, cv2.CV_16SC2,
+                               nninterpolation=nearest)
+        _panorama_maps_cache[key] = maps
+    return maps
+
+
+def cuda_remap_available():
+    """Check whether OpenCV can remap on a CUDA device."""
+    try:
+        return cv2.cuda.getCudaEnabledDeviceCount() > 0
+    except AttributeError:
+        return False
+
+
+def opencl_remap_available():
+    """Check whether OpenCV can remap through the OpenCL T-API."""
+    try:
+        return cv2.ocl.haveOpenCL()
+    except AttributeError:
+        return False
+
+
+_undistort_umaps_cache = _LRUMapCache(_MAX_CACHED_MAPS)
+_panorama_umaps_cache = _LRUMapCache(_MAX_CACHED_MAPS)
+
+
+def undistort_umaps(camera, new_camera, width, height, nearest=False):
+    """Get the undistortion maps as UMats, kept on the OpenCL device."""
+    key = (camera.id, camera.projection_type, width, height, nearest)
+    maps = _undistort_umaps_cache.get(key)
+    if maps is None:
+        map1, map2 = undistort_maps(camera, new_camera, width, height,
+                                    nearest)
+        maps = (cv2.UMat(map1), cv2.UMat(map2) if map2 is not None else None)
+        _undistort_umaps_cache[key] = maps
+    return maps
+
+
+def _panorama_umaps(panoshot, perspectiveshot, src_h, src_w, nearest=False):
+    """Get the remap maps for a perspective view as UMats."""
+    rotation = _panorama_rotation(panoshot, perspectiveshot)
+    key = _panorama_map_key(perspectiveshot.camera, rotation,
+                            src_h, src_w, nearest)
+    maps = _panorama_umaps_cache.get(key)
+    if maps is None:
+        map1, map2 = _panorama_maps(panoshot, perspectiveshot,
+                                    src_h, src_w, nearest)
+        maps = (cv2.UMat(map1), cv2.UMat(map2) if map2 is not None else None)
+        _panorama_umaps_cache[key] = maps
+    return maps
+
+
+def render_perspective_views_of_a_panorama_opencl(image, panoshot, subshots,
+                                                  interpolation):
+    """Render perspective views via the T-API, uploading the panorama once."""
+    src_h, src_w = image.shape[:2]
+    nearest = interpolation == cv2.INTER_NEAREST
+    u_image = cv2.UMat(image)
+    res = {}
+    for subshot in subshots:
+        u_map1, u_map2 = _panorama_umaps(panoshot, subshot,
+                                         src_h, src_w, nearest)
+        res[subshot.id] = cv2.remap(
+            u_image, u_map1, u_map2, interpolation,
+            borderMode=cv2.BORDER_WRAP).get()
+    return res
+
+
+def _panorama_gpu_maps(panoshot, perspectiveshot, src_h, src_w):
+    """Get the remap maps for a perspective view as GpuMats."""
+    rotation = _panorama_rotation(panoshot, perspectiveshot)
+    key = _panorama_map_key(perspectiveshot.camera, rotation, src_h, src_w)
+    maps = _panorama_gpu_maps_cache.get(key)
+    if maps is None:
+        src_x, src_y = _build_panorama_map(
+            perspectiveshot, rotation, src_h, src_w)
+        gpu_x = cv2.cuda_GpuMat()
+        gpu_x.upload(src_x)
+        gpu_y = cv2.cuda_GpuMat()
+        gpu_y.upload(src_y)
+        maps = (gpu_x, gpu_y)
+        _panorama_gpu_maps_cache[key] = maps
+    return maps
+
+
+def render_perspective_views_of_a_panorama_cuda(image, panoshot, subshots,
+                                                interpolation):
+    """Render perspective views on the GPU, uploading the panorama once."""
+    src_h, src_w = image.shape[:2]
+    gpu_image = cv2.cuda_GpuMat()
+    gpu_image.upload(image)
+    res = {}
+    for subshot in subshots:
+        gpu_x, gpu_y = _panorama_gpu_maps(panoshot, subshot, src_h, src_w)
+        res[subshot.id] = cv2.cuda.remap(
+            gpu_image, gpu_x, gpu_y, interpolation,
+            borderMode=cv2.BORDER_WRAP).download()
+    return res
 
-    # Project to panorama pixels
-    src_x, src_y = panoshot.camera.project((rotated_bearings[:, 0],
-                                            rotated_bearings[:, 1],
-                                            rotated_bearings[:, 2]))
-    src_pixels = np.column_stack([src_x.ravel(), src_y.ravel()])
 
-    src_pixels_denormalized = features.denormalized_image_coordinates(
-        src_pixels, image.shape[1], image.shape[0])
-
-    src_pixels_denormalized.shape = dst_shape + (2,)
-
-    # Sample color
-    x = src_pixels_denormalized[..., 0].astype(np.float32)
-    y = src_pixels_denormalized[..., 1].astype(np.float32)
-    colors = cv2.remap(image, x, y, interpolation, borderMode=cv2.BORDER_WRAP)
+def render_perspective_view_of_a_panorama(image, panoshot, perspectiveshot,
+                                          interpolation=cv2.INTER_LINEAR):
+    """Render a perspective view of a panorama."""
+    src_h, src_w = image.shape[:2]
+    map1, map2 = _panorama_maps(panoshot, perspectiveshot, src_h, src_w,
+                                interpolation == cv2.INTER_NEAREST)
+    return cv2.remap(image, map1, map2, interpolation,
+                     borderMode=cv2.BORDER_WRAP)
+
+
+def _build_panorama_map(perspectiveshot, rotation, src_h, src_w):
+    """Map from perspective view pixels to panorama pixels."""
+    # Destination pixel coordinates, normalized in place to avoid the
+    # intermediate copies of the column_stack / normalize / denormalize
+    # round trip, which dominate the cost of this function.
+    camera = perspectiveshot.camera
+    dst_size = float(max(camera.width, camera.height))
+    xs = np.arange(camera.width, dtype=np.float32)
+    xs += np.float32(0.5 - camera.width / 2.0)
+    xs /= np.float32(dst_size)
+    ys = np.arange(camera.height, dtype=np.float32)
+    ys += np.float32(0.5 - camera.height / 2.0)
+    ys /= np.float32(dst_size)
+    x, y = np.meshgrid(xs, ys)
+
+    # Convert to bearings.  For the undistorted perspective cameras built
+    # here the bearing direction is simply (x, y, focal); normalization is
+    # not needed since the spherical projection below is scale invariant.
+    if camera.k1 or camera.k2:
+        pixels = np.column_stack([x.ravel(), y.ravel()])
+        bearings = camera.pixel_bearing_many(pixels).astype(np.float32)
+        bx = bearings[:, 0].reshape(x.shape)
+        by = bearings[:, 1].reshape(x.shape)
+        bz = bearings[:, 2].reshape(x.shape)
+    else:
+        bx, by = x, y
+        bz = np.full_like(x, camera.focal)
 
-    return colors
+    # Rotate to panorama reference frame
+    rotation = rotation.astype(np.float32)
+    rx = rotation[0, 0] * bx + rotation[0, 1] * by + rotation[0, 2] * bz
+    ry = rotation[1, 0] * bx + rotation[1, 1] * by + rotation[1, 2] * bz
+    rz = rotation[2, 0] * bx + rotation[2, 1] * by + rotation[2, 2] * bz
+
+    # Reference counting keeps every intermediate alive until the scope
+    # exits, so drop the full-size buffers as soon as they are consumed
+    # to cut the peak transient memory of each worker.
+    del bx, by, bz, x, y
+
+    # Project to denormalized panorama pixels in place
+    scale = np.float32(max(src_w, src_h) / (2 * np.pi))
+    src_x = np.arctan2(rx, rz)
+    src_x *= scale
+    src_x += np.float32(0.5 * src_w - 0.5)
+    np.hypot(rx, rz, out=rz)
+    del rx
+    src_y = np.arctan2(ry, rz)
+    del ry, rz
+    src_y *= scale
+    src_y += np.float32(0.5 * src_h - 0.5)
+    return src_x, src_y
 
 
 def add_subshot_tracks(graph, ugraph, shot, subshot):
@@ -326,27 +682,33 @@ def add_subshot_tracks(graph, ugraph, shot, subshot):
 def add_pano_subshot_tracks(graph, ugraph, panoshot, perspectiveshot):
     """Add edges between subshots and visible tracks."""
     ugraph.add_node(perspectiveshot.id, bipartite=0)
-    for track in graph[panoshot.id]:
-        edge = graph[panoshot.id][track]
-        feature = edge['feature']
-        bearing = panoshot.camera.pixel_bearing(feature)
-        rotation = np.dot(perspectiveshot.pose.get_rotation_matrix(),
-                          panoshot.pose.get_rotation_matrix().T)
-
-        rotated_bearing = np.dot(bearing, rotation.T)
-        if rotated_bearing[2] <= 0:
-            continue
-
-        perspective_feature = perspectiveshot.camera.project(rotated_bearing)
-        if (perspective_feature[0] < -0.5 or
-                perspective_feature[0] > 0.5 or
-                perspective_feature[1] < -0.5 or
-                perspective_feature[1] > 0.5):
-            continue
+    edges = graph[panoshot.id]
+    tracks = list(edges)
+    if not tracks:
+        return
+
+    # Convert and project all track features in one batch; looping per
+    # track spends most of its time in Python call overhead.
+    bearings = panoshot.camera.pixel_bearing_many(
+        np.array([edges[track]['feature'] for track in tracks]))
+    rotation = np.dot(perspectiveshot.pose.get_rotation_matrix(),
+                      panoshot.pose.get_rotation_matrix().T)
+    rotated_bearings = np.dot(bearings, rotation.T)
 
+    in_front = np.nonzero(rotated_bearings[:, 2] > 0)[0]
+    if not len(in_front):
+        return
+    perspective_features = perspectiveshot.camera.project_many(
+        rotated_bearings[in_front])
+    in_frame = np.all(np.abs(perspective_features) <= 0.5, axis=1)
+
+    for index, feature in zip(in_front[in_frame],
+                              perspective_features[in_frame]):
+        track = tracks[index]
+        edge = edges[track]
         ugraph.add_node(track, bipartite=1)
         ugraph.add_edge(perspectiveshot.id,
                         track,
-                        feature=perspective_feature,
+                        feature=feature,
                         feature_id=edge['feature_id'],
                         feature_color=edge['feature_color'])
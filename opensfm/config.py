@@ -115,6 +115,8 @@ nav_rotation_threshold: 30            # Maximum general rotation in degrees betw
 # Params for image undistortion
 undistorted_image_format: jpg         # Format in which to save the undistorted images
 undistorted_image_max_size: 100000    # Max width and height of the undistorted image
+undistorted_use_cuda_remap: no        # Remap panoramas on the GPU when OpenCV has CUDA support
+undistorted_use_opencl_remap: no      # Remap through OpenCV's OpenCL T-API when available
 
 # Params for depth estimation
 depthmap_method: PATCH_MATCH_SAMPLE   # Raw depthmap computation algorithm (PATCH_MATCH, BRUTE_FORCE, PATCH_MATCH_SAMPLE)
@@ -28,14 +28,22 @@ else:
 
 
 # Parallel processes
-def parallel_map(func, args, num_proc):
-    """Run function for all arguments using multiple processes."""
+def parallel_map(func, args, num_proc, max_batch_size=1):
+    """Run function for all arguments using multiple processes.
+
+    Arguments are dispatched in batches of up to max_batch_size to
+    amortize the pickling overhead per task; pass None to let the batch
+    size grow with the number of arguments per worker.
+    """
     num_proc = min(num_proc, len(args))
     if num_proc <= 1:
         return list(map(func, args))
     else:
+        batch_size = max(1, len(args) // (num_proc * 4))
+        if max_batch_size:
+            batch_size = min(batch_size, max_batch_size)
         with get_reusable_executor(max_workers=num_proc, timeout=None) as e:
-            return list(e.map(func, args))
+            return list(e.map(func, args, chunksize=batch_size))
 
 
 # Memory usage
@@ -23,6 +23,15 @@ from opensfm import context
 logger = logging.getLogger(__name__)
 
 
+# Use libjpeg-turbo for JPEG encoding when PyTurboJPEG is installed;
+# its SIMD encoder is several times faster than the one imwrite uses.
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB
+    turbojpeg = TurboJPEG()
+except Exception:
+    turbojpeg = None
+
+
 def camera_from_json(key, obj):
     """
     Read camera from a json object
@@ -591,6 +600,16 @@ def imread(filename, grayscale=False):
 
 def imwrite(filename, image):
     """Write an image to a file"""
+    if (turbojpeg is not None and
+            filename.lower().endswith(('.jpg', '.jpeg')) and
+            image.dtype == np.uint8 and
+            len(image.shape) == 3 and image.shape[2] == 3):
+        # Encoding directly from RGB also skips the BGR conversion copy.
+        buf = turbojpeg.encode(np.ascontiguousarray(image), quality=95,
+                               pixel_format=TJPF_RGB)
+        with open(filename, 'wb') as fout:
+            fout.write(buf)
+        return
     if len(image.shape) == 3:
         image = image[:, :, ::-1]  # Turn RGB to BGR
     cv2.imwrite(filename, image)